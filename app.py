@@ -1,10 +1,25 @@
 import os
+import time
+import hashlib
+import uuid
 import boto3
-import psycopg2
-from psycopg2.extras import execute_values, RealDictCursor
-from flask import Flask, jsonify
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import select
+import weakref
+from datetime import datetime
+import numpy as np
+from psycopg2 import InterfaceError, OperationalError
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+from psycopg2.extras import execute_values
+import orjson
+from flask import Flask, Response, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from dotenv import load_dotenv
 from flask_cors import CORS, cross_origin # Importar cross_origin
+from flask_compress import Compress # Compresión br/gzip de las respuestas
 import atexit # Para apagar el scheduler
 from apscheduler.schedulers.background import BackgroundScheduler # Para tareas en segundo plano
 
@@ -12,14 +27,105 @@ from apscheduler.schedulers.background import BackgroundScheduler # Para tareas
 load_dotenv()
 
 # --- Configuración de la Aplicación Flask ---
+class OrjsonProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask basado en orjson (más rápido que el json de la librería estándar)."""
+    def dumps(self, obj, **kwargs):
+        # self.default mantiene el soporte de Flask para Decimal, UUID, dataclasses, etc.
+        option = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:  # igual que el proveedor por defecto de Flask (sort_keys = True)
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 # Configurar CORS para permitir peticiones desde http://localhost:3000 (tu React app)
 CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}})
+# Comprimir respuestas (el JSON de lecturas se comprime muy bien): brotli si el navegador lo acepta, si no gzip
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 1024
+Compress(app)
 
 # --- Configuración de Boto3 para DynamoDB ---
 DYNAMO_TABLE_NAME = 'datos_sensores' # ¡Usa el nombre exacto de tu tabla!
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1') # Cambia a tu región
-dynamo_table = dynamodb.Table(DYNAMO_TABLE_NAME)
+# Número de segmentos (hilos) para el Scan paralelo de DynamoDB
+DYNAMO_SCAN_SEGMENTS = int(os.getenv("DYNAMO_SCAN_SEGMENTS", "4"))
+# Cliente de bajo nivel (no resource): los números llegan como texto {'N': '23.4'} y se convierten
+# directamente a float/int, sin crear un decimal.Decimal intermedio por cada atributo.
+# Un único cliente compartido por todas las sincronizaciones; el pool HTTP debe alcanzar para los
+# hilos del Scan/Query paralelo y los reintentos adaptativos suavizan el throttling en ráfagas.
+dynamo_client = boto3.client(
+    'dynamodb',
+    region_name='us-east-1', # Cambia a tu región
+    config=Config(
+        max_pool_connections=max(32, DYNAMO_SCAN_SEGMENTS),
+        retries={'max_attempts': 10, 'mode': 'adaptive'},
+        tcp_keepalive=True
+    )
+)
+# Solo pedimos los atributos que se usan en la sincronización ('timestamp' es palabra reservada)
+DYNAMO_PROJECTION = {
+    'ProjectionExpression': 'id_lectura, device_id, temperatura, humedad, distancia_cm, '
+                            'luz_porcentaje, estado_luz, #ts',
+    'ExpressionAttributeNames': {'#ts': 'timestamp'},
+}
+# GSI (device_id, timestamp) para la sincronización incremental. Si no se define, siempre se hace Scan.
+DYNAMO_TS_INDEX = os.getenv("DYNAMO_TS_INDEX")
+# Cada cuántas sincronizaciones se fuerza un Scan completo (para descubrir dispositivos nuevos)
+DYNAMO_FULL_SCAN_EVERY = int(os.getenv("DYNAMO_FULL_SCAN_EVERY", "60"))
+
+# --- Estado de la sincronización incremental (se actualiza después de cada commit) ---
+# device_id -> último timestamp UNIX ya guardado en PostgreSQL para ese dispositivo.
+# Cada dispositivo se consulta en el GSI desde su propia marca, así un dispositivo atrasado
+# (o que envía lecturas en bloque) no se salta lecturas por culpa de otro más adelantado.
+device_watermarks = {}
+sync_runs = 0          # Número de sincronizaciones ejecutadas
+# id_lectura ya guardados en PostgreSQL -> (device_id, timestamp UNIX). Se carga en la primera sincronización.
+# - Con GSI (Query incremental) se acota a lo que la Query puede volver a traer: las lecturas de cada
+#   dispositivo con timestamp >= su marca menos SEEN_IDS_MARGIN_SECONDS, y se poda tras cada commit.
+#   Lo que un Scan completo traiga fuera de esa ventana se consulta en PostgreSQL antes de insertar.
+# - Solo con Scan (sin DYNAMO_TS_INDEX) cada sincronización trae la tabla entera, así que se guardan
+#   todos los ids: unos 200 bytes por lectura (~200 MB por millón de filas en lecturas_sensores).
+seen_ids = None
+SEEN_IDS_BOUNDED = bool(DYNAMO_TS_INDEX)
+SEEN_IDS_MARGIN_SECONDS = int(os.getenv("SEEN_IDS_MARGIN_SECONDS", "3600"))
+_seen_ids_lock = threading.Lock()
+# pg_postmaster_start_time() visto en la última sincronización, para detectar reinicios de PostgreSQL
+postgres_start_time = None
+
+# --- Resumen de lecturas_sensores para el ETag de /api/lecturas ---
+# (MAX(timestamp_lectura), COUNT(*)); solo el proceso que ejecuta el scheduler lo mantiene al día,
+# los demás procesos (otros workers de gunicorn) lo consultan en cada petición.
+lecturas_stats = None
+scheduler_running = False
+
+# --- Caché columnar (NumPy) de las lecturas recientes para servir /api/lecturas sin PostgreSQL ---
+# Igual que lecturas_stats, solo existe en el proceso del scheduler, que la actualiza tras cada commit.
+LECTURAS_CACHE_HOURS = int(os.getenv("LECTURAS_CACHE_HOURS", "24"))
+# JSON de una lectura tal como lo entrega /api/lecturas. Lo arma siempre PostgreSQL (consulta y caché)
+# para que la respuesta sea idéntica byte a byte venga de donde venga, con cualquier TimeZone del servidor.
+LECTURAS_JSON_FILA = """json_build_object(
+    'id_lectura', id_lectura, 'device_id', device_id,
+    'temperatura', temperatura::float8, 'humedad', humedad::float8, 'distancia_cm', distancia_cm::float8,
+    'luz_porcentaje', luz_porcentaje, 'estado_luz', estado_luz, 'timestamp_lectura', timestamp_lectura
+)::text"""
+# Columnas que se leen (SELECT/RETURNING) para la caché, en el mismo orden que LECTURAS_CACHE_DTYPES.
+# ::timestamptz: el epoch coincide con to_timestamp() también si la columna es timestamp sin zona.
+LECTURAS_CACHE_COLUMNS = """
+    EXTRACT(EPOCH FROM timestamp_lectura::timestamptz)::float8, id_lectura::text,
+""" + LECTURAS_JSON_FILA
+LECTURAS_CACHE_DTYPES = (
+    ('timestamp_lectura', 'f8'),  # segundos UNIX; orden (timestamp, id) ascendente
+    ('id_lectura', 'U36'),        # id como texto fijo: desempate del orden
+    ('fila', object),             # JSON ya serializado de la lectura
+)
+lecturas_cache = None  # dict columna -> np.ndarray
+
+# --- Paginación del Dashboard ---
+LECTURAS_DEFAULT_LIMIT = int(os.getenv("LECTURAS_DEFAULT_LIMIT", "1000"))
+LECTURAS_MAX_LIMIT = int(os.getenv("LECTURAS_MAX_LIMIT", "10000"))
 
 # --- Configuración de la Conexión a PostgreSQL ---
 DB_NAME = os.getenv("DB_NAME")
@@ -28,43 +134,459 @@ DB_PASS = os.getenv("DB_PASS")
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "5432")
 
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Segundos que un hilo espera una conexión libre antes de fallar
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Pool de conexiones compartido por el scheduler y los endpoints (se crea en el primer uso)
+db_pool = None
+_db_pool_lock = threading.Lock()
+# ThreadedConnectionPool no espera: con todas las conexiones prestadas getconn() lanza PoolError.
+# El semáforo hace esperar a los hilos que pasen de DB_POOL_MAX (hilos de gunicorn + sincronización).
+_db_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+def _get_db_pool():
+    """Crea (una sola vez) y retorna el pool de conexiones a PostgreSQL."""
+    global db_pool
+    if db_pool is None:
+        with _db_pool_lock:
+            if db_pool is None:
+                db_pool = ThreadedConnectionPool(
+                    minconn=DB_POOL_MIN,
+                    maxconn=DB_POOL_MAX,
+                    dbname=DB_NAME,
+                    user=DB_USER,
+                    password=DB_PASS,
+                    host=DB_HOST,
+                    port=DB_PORT
+                )
+                atexit.register(db_pool.closeall)
+    return db_pool
+
+def _connection_is_broken(conn):
+    """
+    Detecta, sin ir al servidor, una conexión del pool que ya no sirve: cerrada por psycopg2 o con
+    datos pendientes de leer estando ociosa (un backend terminado o reiniciado envía el error/EOF).
+    """
+    if conn.closed:
+        return True
+    # poll y no select: select.select no acepta descriptores >= 1024
+    poller = select.poll()
+    poller.register(conn, select.POLLIN)
+    return bool(poller.poll(0))
+
 def get_db_connection():
-    """Crea y retorna una nueva conexión a la base de datos."""
-    conn = psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASS,
-        host=DB_HOST,
-        port=DB_PORT
+    """
+    Toma una conexión del pool (evita el handshake TCP/TLS/auth en cada petición).
+    Si todas están prestadas espera hasta DB_POOL_TIMEOUT segundos; cada conexión obtenida
+    debe devolverse con release_db_connection.
+    """
+    pool = _get_db_pool()
+    if not _db_pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise PoolError(f"sin conexiones libres tras {DB_POOL_TIMEOUT:g} s (DB_POOL_MAX={DB_POOL_MAX})")
+    try:
+        # Se descartan las conexiones rotas (p. ej. tras reiniciar PostgreSQL); cuando el pool se queda
+        # sin conexiones ociosas abre una nueva
+        for _ in range(DB_POOL_MAX):
+            conn = pool.getconn()
+            if not _connection_is_broken(conn):
+                return conn
+            print("BD: Descartando conexión rota del pool.")
+            pool.putconn(conn, close=True)
+        return pool.getconn()
+    except BaseException:
+        _db_pool_slots.release()
+        raise
+
+# Lotes pequeños (los habituales en la sincronización incremental) usan una sentencia preparada
+# por conexión: se planifica una sola vez y se reutiliza en cada sincronización.
+PREPARED_INSERT_MAX_BATCH = 100
+PREPARE_INSERT_LECTURAS = """
+    PREPARE ins_lecturas (uuid[], varchar[], numeric[], numeric[], numeric[], int[], varchar[], bigint[]) AS
+    INSERT INTO lecturas_sensores (
+        id_lectura, device_id, temperatura, humedad, distancia_cm,
+        luz_porcentaje, estado_luz, timestamp_lectura
+    )
+    SELECT id, dev, temp, hum, dist, luz, estado, to_timestamp(ts)
+    FROM unnest($1, $2, $3, $4, $5, $6, $7, $8) AS t(id, dev, temp, hum, dist, luz, estado, ts)
+    ON CONFLICT (id_lectura) DO NOTHING
+    RETURNING """ + LECTURAS_CACHE_COLUMNS
+# Conexiones del pool que ya tienen ins_lecturas preparada (PREPARE dura lo que dura la sesión)
+_prepared_conns = weakref.WeakSet()
+
+def insert_lecturas_prepared(conn, cursor, rows):
+    """
+    Inserta un lote pequeño con la sentencia preparada ins_lecturas, pasando cada columna como array.
+    Un solo EXECUTE por lote; retorna las filas realmente insertadas (columnas de la caché).
+    """
+    if conn not in _prepared_conns:
+        cursor.execute(PREPARE_INSERT_LECTURAS)
+        _prepared_conns.add(conn)
+    columnas = [list(col) for col in zip(*rows)]
+    cursor.execute(
+        "EXECUTE ins_lecturas (%s::uuid[], %s::varchar[], %s::numeric[], %s::numeric[], "
+        "%s::numeric[], %s::int[], %s::varchar[], %s::bigint[])",
+        columnas
+    )
+    return cursor.fetchall()
+
+def release_db_connection(conn):
+    """Devuelve la conexión al pool (hace rollback si quedó una transacción abierta); las rotas se descartan."""
+    pool = _get_db_pool()
+    try:
+        pool.putconn(conn, close=bool(conn.closed))
+    except (OperationalError, InterfaceError):
+        # Falló el rollback del pool: la conexión se perdió
+        pool.putconn(conn, close=True)
+    finally:
+        _db_pool_slots.release()
+
+def _safe_rollback(conn):
+    """Rollback que no lanza excepción si la conexión ya se perdió (release_db_connection la descarta)."""
+    if conn.closed:
+        return
+    try:
+        conn.rollback()
+    except (OperationalError, InterfaceError):
+        pass
+
+_deserializer = TypeDeserializer()
+
+def _flatten_item(raw):
+    """Quita el descriptor de tipo de un item crudo: {'temperatura': {'N': '23.4'}} -> {'temperatura': '23.4'}.
+
+    S y N se dejan como texto (Postgres hace la conversión); el resto pasa por
+    TypeDeserializer, de modo que {'NULL': True} llega como None.
+    """
+    item = {}
+    for name, typed in raw.items():
+        (tipo, value), = typed.items()
+        item[name] = value if tipo in ('S', 'N') else _deserializer.deserialize(typed)
+    return item
+
+def _scan_segment(segment, total_segments):
+    """Recorre (paginando) un segmento del Scan paralelo de DynamoDB."""
+    items = []
+    scan_kwargs = dict(DYNAMO_PROJECTION, TableName=DYNAMO_TABLE_NAME,
+                       Segment=segment, TotalSegments=total_segments)
+    while True:
+        response = dynamo_client.scan(**scan_kwargs)
+        items.extend(_flatten_item(raw) for raw in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return items
+
+def scan_dynamo_parallel(total_segments=DYNAMO_SCAN_SEGMENTS):
+    """Escanea toda la tabla de DynamoDB con un Scan paralelo (un hilo por segmento)."""
+    items = []
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        futures = [executor.submit(_scan_segment, i, total_segments) for i in range(total_segments)]
+        for future in as_completed(futures):
+            items.extend(future.result())
+    return items
+
+def _query_device_since(device_id, since_ts):
+    """Consulta (paginando) el GSI de un dispositivo desde un timestamp dado."""
+    items = []
+    query_kwargs = dict(
+        DYNAMO_PROJECTION,
+        TableName=DYNAMO_TABLE_NAME,
+        IndexName=DYNAMO_TS_INDEX,
+        # Se usa >= para no perder lecturas del mismo segundo; el ON CONFLICT descarta las repetidas
+        KeyConditionExpression='device_id = :device_id AND #ts >= :since',
+        ExpressionAttributeValues={':device_id': {'S': device_id}, ':since': {'N': str(since_ts)}},
+    )
+    while True:
+        response = dynamo_client.query(**query_kwargs)
+        items.extend(_flatten_item(raw) for raw in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return items
+
+def query_dynamo_since(watermarks):
+    """Obtiene solo las lecturas nuevas consultando en paralelo el GSI de cada dispositivo desde su marca."""
+    items = []
+    with ThreadPoolExecutor(max_workers=DYNAMO_SCAN_SEGMENTS) as executor:
+        futures = [executor.submit(_query_device_since, d, ts) for d, ts in watermarks.items()]
+        for future in as_completed(futures):
+            items.extend(future.result())
+    return items
+
+def fetch_dynamo_items():
+    """
+    Decide entre sincronización incremental (Query al GSI) o Scan completo.
+    Se hace Scan en el arranque, si no hay GSI configurado o cada DYNAMO_FULL_SCAN_EVERY ejecuciones.
+    """
+    full_scan = (
+        not DYNAMO_TS_INDEX
+        or not device_watermarks
+        or sync_runs % DYNAMO_FULL_SCAN_EVERY == 0
     )
-    return conn
+    if full_scan:
+        print("Sync: Ejecutando Scan completo de DynamoDB.")
+        return scan_dynamo_parallel()
+    print(f"Sync: Consultando lecturas nuevas de {len(device_watermarks)} dispositivos.")
+    try:
+        return query_dynamo_since(dict(device_watermarks))
+    except Exception as e:
+        # GSI inexistente o mal configurado: no dejamos de sincronizar, se usa el Scan completo
+        print(f"Sync: Error al consultar el GSI '{DYNAMO_TS_INDEX}' ({e}); se hace Scan completo.")
+        return scan_dynamo_parallel()
+
+def _update_sync_state(items):
+    """Actualiza el estado incremental con los items ya confirmados en PostgreSQL."""
+    for item in items:
+        device_id = item.get('device_id')
+        if not device_id:
+            continue
+        ts = int(float(item['timestamp']))
+        if device_id not in device_watermarks or ts > device_watermarks[device_id]:
+            device_watermarks[device_id] = ts
+        if seen_ids is not None:
+            seen_ids[item['id_lectura']] = (device_id, ts)
+    if seen_ids is not None and SEEN_IDS_BOUNDED:
+        _prune_seen_ids()
+
+def _prune_seen_ids():
+    """Quita de seen_ids las lecturas más viejas que la marca de su dispositivo menos el margen."""
+    global seen_ids
+    seen_ids = {
+        id_lectura: (device_id, ts)
+        for id_lectura, (device_id, ts) in seen_ids.items()
+        if ts >= device_watermarks.get(device_id, ts) - SEEN_IDS_MARGIN_SECONDS
+    }
+
+def _reset_sync_state():
+    """
+    Olvida el estado incremental para que la próxima sincronización lo recargue desde PostgreSQL.
+    Necesario porque los commits son asíncronos: si PostgreSQL se cae, las últimas transacciones
+    confirmadas pueden perderse y el estado en memoria quedaría por delante de la base de datos.
+    """
+    global seen_ids, lecturas_stats, lecturas_cache
+    device_watermarks.clear()
+    seen_ids = None
+    lecturas_stats = None
+    lecturas_cache = None
+
+def check_postgres_restart():
+    """
+    Detecta un reinicio de PostgreSQL entre sincronizaciones. El pool descarta las conexiones rotas
+    sin lanzar error, así que se compara pg_postmaster_start_time(): si cambió, los últimos commits
+    asíncronos pudieron perderse y se olvida el estado incremental para volver a traerlos.
+    """
+    global postgres_start_time
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_postmaster_start_time()")
+        inicio = cursor.fetchone()[0]
+        cursor.close()
+    finally:
+        release_db_connection(conn)
+    if postgres_start_time is not None and inicio != postgres_start_time:
+        print("Sync: PostgreSQL se reinició; se recarga el estado de sincronización.")
+        _reset_sync_state()
+    postgres_start_time = inicio
+
+def _etag_matches(etag):
+    """Compara con If-None-Match, aceptando también la variante comprimida de Flask-Compress ('<etag>:gzip')."""
+    return any(tag == etag or tag.startswith(etag + ':')
+               for tag in request.if_none_match.as_set(include_weak=True))
+
+def fetch_lecturas_stats(cursor):
+    """Consulta el resumen (último timestamp, total de filas) que identifica la versión de los datos."""
+    cursor.execute("SELECT MAX(timestamp_lectura)::text, COUNT(*) FROM lecturas_sensores")
+    return cursor.fetchone()
+
+def _cache_cutoff_ts():
+    """Timestamp UNIX más antiguo que se mantiene en la caché de lecturas."""
+    return int(time.time()) - LECTURAS_CACHE_HOURS * 3600
+
+def _cache_from_rows(rows):
+    """Convierte filas (en el orden de LECTURAS_CACHE_COLUMNS) en un array NumPy por columna."""
+    columnas = list(zip(*rows)) if rows else [()] * len(LECTURAS_CACHE_DTYPES)
+    return {name: np.array(col, dtype=dtype) for (name, dtype), col in zip(LECTURAS_CACHE_DTYPES, columnas)}
+
+def load_lecturas_cache(cursor):
+    """Carga desde PostgreSQL las lecturas de las últimas LECTURAS_CACHE_HOURS horas (arranque en frío)."""
+    cursor.execute(
+        f"SELECT {LECTURAS_CACHE_COLUMNS} FROM lecturas_sensores "
+        "WHERE timestamp_lectura >= to_timestamp(%s) ORDER BY timestamp_lectura ASC, id_lectura ASC",
+        (_cache_cutoff_ts(),)
+    )
+    return _cache_from_rows(cursor.fetchall())
+
+def append_lecturas_cache(cache, rows):
+    """Retorna una caché nueva con las filas insertadas, ordenada por (timestamp, id) y sin las lecturas viejas."""
+    nuevas = _cache_from_rows(rows)
+    unida = {name: np.concatenate((cache[name], nuevas[name])) for name in cache}
+    orden = np.lexsort((unida['id_lectura'], unida['timestamp_lectura']))
+    orden = orden[unida['timestamp_lectura'][orden] >= _cache_cutoff_ts()]
+    return {name: col[orden] for name, col in unida.items()}
+
+def _refresh_lecturas_cache(cursor, stats, insertados=()):
+    """
+    Deja lecturas_stats en `stats` y la caché al día: agrega las filas `insertados` o, si el total
+    no cuadra con lo insertado (otro proceso escribió, o no hay caché), la recarga desde PostgreSQL.
+    """
+    global lecturas_stats, lecturas_cache
+    if lecturas_stats is not None and stats[1] < lecturas_stats[1]:
+        # Hay menos filas que antes: una recuperación tras caída (sin reinicio del postmaster)
+        # descartó commits asíncronos, o se borraron filas. Se recarga todo desde PostgreSQL.
+        print("Sync: lecturas_sensores tiene menos filas que antes; se recarga el estado de sincronización.")
+        _reset_sync_state()
+    if scheduler_running:
+        if (lecturas_cache is None or lecturas_stats is None
+                or stats[1] != lecturas_stats[1] + len(insertados)):
+            lecturas_cache = load_lecturas_cache(cursor)
+        elif insertados:
+            lecturas_cache = append_lecturas_cache(lecturas_cache, insertados)
+    lecturas_stats = stats
+
+def load_lecturas_state_if_missing():
+    """
+    Arranque en frío sin filas nuevas (DynamoDB vacío o todo ya sincronizado): carga el resumen y la
+    caché, que si no solo se llenarían después de la primera inserción.
+    """
+    if not scheduler_running or (lecturas_stats is not None and lecturas_cache is not None):
+        return
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        _refresh_lecturas_cache(cursor, fetch_lecturas_stats(cursor))
+        cursor.close()
+    except Exception as e:
+        print(f"Sync: Error al cargar la caché de lecturas: {e}")
+    finally:
+        if conn: release_db_connection(conn)
+
+def lecturas_from_cache(cache, limit, before, before_id=None, completa=False):
+    """
+    Arma el JSON de la página pedida desde la caché (mismo criterio que la consulta a PostgreSQL).
+    Retorna None si la caché no tiene `limit` lecturas anteriores a (`before`, `before_id`), salvo que
+    sea `completa` (contiene toda la tabla): entonces la página simplemente trae menos lecturas.
+    """
+    ts = cache['timestamp_lectura']
+    if before is None:
+        fin = len(ts)
+    else:
+        fin = int(np.searchsorted(ts, before, side='left'))
+        if before_id is not None:
+            # Desempate: del mismo segundo entran las lecturas con id menor que before_id
+            hasta = int(np.searchsorted(ts, before, side='right'))
+            fin += int(np.searchsorted(cache['id_lectura'][fin:hasta], before_id, side='left'))
+    inicio = fin - limit
+    if inicio < 0:
+        if not completa:
+            return None
+        inicio = 0
+    return '[' + ','.join(cache['fila'][inicio:fin]) + ']'
+
+def get_seen_ids():
+    """
+    Retorna los id_lectura ya sincronizados, cargándolos desde PostgreSQL la primera vez.
+    Con SEEN_IDS_BOUNDED solo se cargan las lecturas recientes de cada dispositivo (ventana de
+    SEEN_IDS_MARGIN_SECONDS hasta su último timestamp); si no, todas.
+    """
+    global seen_ids
+    if seen_ids is None:
+        with _seen_ids_lock:
+            if seen_ids is None:
+                conn = get_db_connection()
+                try:
+                    # Cursor con nombre para no traer todos los ids en un solo bloque
+                    cursor = conn.cursor(name='carga_ids_vistos')
+                    cursor.itersize = 10000
+                    if SEEN_IDS_BOUNDED:
+                        cursor.execute("""
+                            SELECT id_lectura::text, device_id, EXTRACT(EPOCH FROM timestamp_lectura::timestamptz)::bigint
+                            FROM (
+                                SELECT id_lectura, device_id, timestamp_lectura,
+                                       MAX(timestamp_lectura) OVER (PARTITION BY device_id) AS max_ts
+                                FROM lecturas_sensores
+                            ) l
+                            WHERE timestamp_lectura >= max_ts - make_interval(secs => %s)
+                        """, (SEEN_IDS_MARGIN_SECONDS,))
+                    else:
+                        cursor.execute("""
+                            SELECT id_lectura::text, device_id, EXTRACT(EPOCH FROM timestamp_lectura::timestamptz)::bigint
+                            FROM lecturas_sensores
+                        """)
+                    ids = {id_lectura: (device_id, ts) for id_lectura, device_id, ts in cursor}
+                    cursor.close()
+                finally:
+                    release_db_connection(conn)
+                print(f"Sync: Cargados {len(ids)} id_lectura ya sincronizados.")
+                seen_ids = ids
+    return seen_ids
+
+def drop_synced_in_db(items):
+    """
+    Con seen_ids acotado, los items que no están en la ventana se confirman en PostgreSQL (una consulta
+    por clave primaria): así un Scan completo (periódico o de respaldo del GSI) no reenvía al INSERT
+    las lecturas viejas que ya existen. En la Query incremental solo llegan aquí las lecturas nuevas.
+    """
+    if not SEEN_IDS_BOUNDED or not items:
+        return items
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id_lectura::text FROM lecturas_sensores WHERE id_lectura = ANY(%s::uuid[])",
+            ([item.get('id_lectura') for item in items],)
+        )
+        existentes = {id_lectura for id_lectura, in cursor}
+        cursor.close()
+    finally:
+        release_db_connection(conn)
+    return [item for item in items if item.get('id_lectura') not in existentes]
 
 # ====================================================================
 # FUNCIÓN DE SINCRONIZACIÓN (MODIFICADA CON MÁS LOGS)
 # ====================================================================
+# Evita que dos sincronizaciones (scheduler y/o manual) corran a la vez sobre los mismos datos
+_sync_lock = threading.Lock()
+
 def run_dynamo_sync():
     """
     Esta función contiene toda la lógica para sincronizar DynamoDB con PostgreSQL.
     Ahora es llamada por el scheduler.
+    Si ya hay una sincronización en curso, no espera: la omite.
     """
     print("--- SCHEDULER: Intentando ejecutar run_dynamo_sync ---") # <-- NUEVO LOG
+    if not _sync_lock.acquire(blocking=False):
+        print("Sync: Omitida, la sincronización anterior sigue en curso.")
+        return {"status": "skipped"}
+    try:
+        return _sync_dynamo_to_postgres()
+    finally:
+        _sync_lock.release()
+
+def _sync_dynamo_to_postgres():
+    """Cuerpo de la sincronización; se ejecuta con _sync_lock adquirido."""
+    global sync_runs
     # Necesitamos el contexto de la app para que la función se ejecute correctamente
     with app.app_context():
         print("--- SCHEDULER: App Context cargado. Iniciando Sincronización. ---") # <-- LOG MEJORADO
         
-        # 1. Escanear y obtener todos los datos de DynamoDB
+        # 0. Antes de decidir entre Query y Scan: si PostgreSQL se reinició, se empieza de cero
         try:
-            items = []
-            scan_kwargs = {}
-            while True:
-                response = dynamo_table.scan(**scan_kwargs)
-                items.extend(response.get('Items', []))
-                if 'LastEvaluatedKey' not in response:
-                    break
-                scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+            check_postgres_restart()
+        except Exception as e:
+            print(f"Sync: Error al consultar la BD local: {e}")
+            return {"status": "error_postgres", "error": str(e)}
+        
+        # 1. Obtener los datos de DynamoDB (Query incremental al GSI o Scan paralelo completo)
+        try:
+            items = fetch_dynamo_items()
             
             if not items:
                 print("Sync: No se encontraron nuevos items en DynamoDB.")
+                load_lecturas_state_if_missing()
                 return {"status": "no_items"}
             
             print(f"Sync: Se encontraron {len(items)} items en DynamoDB.")
@@ -72,16 +594,56 @@ def run_dynamo_sync():
         except Exception as e:
             print(f"Sync: Error al escanear DynamoDB: {e}")
             return {"status": "error_dynamo", "error": str(e)}
+        
+        finally:
+            # Se cuenta cada intento (aunque falle) para que el Scan completo periódico siempre llegue
+            sync_runs += 1
 
-        # 2. Preparar los datos
-        datos_para_insertar = []
-        for item in items:
-            datos_para_insertar.append((
-                item.get('id_lectura'), item.get('device_id'),
-                float(item.get('temperatura', 0.0)), float(item.get('humedad', 0.0)),
-                float(item.get('distancia_cm', 0.0)), int(item.get('luz_porcentaje', 0)),
-                item.get('estado_luz'), int(item.get('timestamp'))
-            ))
+        # 2. Descartar las lecturas que ya se sincronizaron antes y preparar el resto
+        try:
+            ids_vistos = get_seen_ids()
+            items_nuevos = drop_synced_in_db(
+                [item for item in items if item.get('id_lectura') not in ids_vistos]
+            )
+        except Exception as e:
+            print(f"Sync: Error al cargar ids sincronizados desde BD local: {e}")
+            return {"status": "error_postgres", "error": str(e)}
+        
+        if not items_nuevos:
+            _update_sync_state(items)
+            load_lecturas_state_if_missing()
+            print("Sync: Todos los items ya estaban sincronizados.")
+            return {"status": "success", "new_records": 0}
+        
+        # Una sola list comprehension con nombres locales (menos búsquedas de atributos por item).
+        # `or` aplica el valor por defecto tanto si falta el atributo como si llega NULL (None).
+        _float, _int = float, int
+        def filas(items_a_convertir):
+            return [
+                (
+                    get('id_lectura'), get('device_id'),
+                    _float(get('temperatura') or 0.0), _float(get('humedad') or 0.0),
+                    # Los números llegan como texto; se pasa por float para aceptar también '45.0'
+                    _float(get('distancia_cm') or 0.0), _int(_float(get('luz_porcentaje') or 0)),
+                    get('estado_luz'), _int(_float(get('timestamp')))
+                )
+                for get in (item.get for item in items_a_convertir)
+            ]
+        try:
+            datos_para_insertar = filas(items_nuevos)
+        except (TypeError, ValueError):
+            # Algún item trae datos inválidos (p. ej. sin timestamp): se omite ese item, no la sincronización
+            datos_para_insertar, invalidos = [], []
+            for item in items_nuevos:
+                try:
+                    datos_para_insertar.extend(filas([item]))
+                except (TypeError, ValueError) as e:
+                    print(f"Sync: Se omite el item {item.get('id_lectura')} con datos inválidos: {e}")
+                    invalidos.append(item)
+            items = [item for item in items if item not in invalidos]
+            if not datos_para_insertar:
+                _update_sync_state(items)
+                return {"status": "success", "new_records": 0}
 
         # 3. Insertar los datos en PostgreSQL
         conn = None
@@ -89,66 +651,59 @@ def run_dynamo_sync():
             conn = get_db_connection()
             cursor = conn.cursor()
             
-            # 3a. Crear una tabla temporal
-            temp_table_query = """
-            CREATE TEMPORARY TABLE IF NOT EXISTS temp_lecturas (
-                id_lectura VARCHAR(255) PRIMARY KEY,
-                device_id VARCHAR(50),
-                temperatura NUMERIC(5, 2),
-                humedad NUMERIC(5, 2),
-                distancia_cm NUMERIC(10, 3),
-                luz_porcentaje INTEGER,
-                estado_luz VARCHAR(20),
-                timestamp_lectura_unix BIGINT
-            ) ON COMMIT DROP;
-            """
-            cursor.execute(temp_table_query)
+            # Commit asíncrono solo para esta transacción: no esperamos el fsync del WAL.
+            # Si PostgreSQL se cae justo después, se pueden perder las últimas filas confirmadas;
+            # es seguro porque DynamoDB sigue siendo la fuente de verdad, check_postgres_restart() (o una
+            # caída de la conexión durante el sync) fuerza a releerlas y el ON CONFLICT DO NOTHING
+            # hace idempotente la repetición.
+            cursor.execute("SET LOCAL synchronous_commit = off")
             
-            # 3b. Insertar masivamente en la tabla temporal
-            insert_temp_query = """
-                INSERT INTO temp_lecturas (
-                    id_lectura, device_id, temperatura, humedad, distancia_cm, 
-                    luz_porcentaje, estado_luz, timestamp_lectura_unix
-                ) VALUES %s
-                ON CONFLICT (id_lectura) DO NOTHING; 
-            """
-            # Se usa ON CONFLICT DO NOTHING en la tabla temporal por si se repiten datos del scan
-            execute_values(cursor, insert_temp_query, datos_para_insertar)
-            
-            # 3c. Mover datos de la temporal a la permanente, convirtiendo tipos
-            insert_final_query = """
-                INSERT INTO lecturas_sensores (
-                    id_lectura, device_id, temperatura, humedad, distancia_cm, 
-                    luz_porcentaje, estado_luz, timestamp_lectura
+            # 3a. Insertar directamente en la tabla permanente, convirtiendo tipos en el template
+            # (sin tabla temporal: un solo INSERT por página de 1000 filas).
+            # Los lotes pequeños usan la sentencia preparada para no replanificar en cada sincronización.
+            if len(datos_para_insertar) < PREPARED_INSERT_MAX_BATCH:
+                insertados = insert_lecturas_prepared(conn, cursor, datos_para_insertar)
+            else:
+                insert_query = """
+                    INSERT INTO lecturas_sensores (
+                        id_lectura, device_id, temperatura, humedad, distancia_cm, 
+                        luz_porcentaje, estado_luz, timestamp_lectura
+                    ) VALUES %s
+                    ON CONFLICT (id_lectura) DO NOTHING
+                    RETURNING """ + LECTURAS_CACHE_COLUMNS
+                insertados = execute_values(
+                    cursor, insert_query, datos_para_insertar,
+                    # id_lectura de VARCHAR a UUID y timestamp de UNIX int a Timestamp
+                    template="(%s::uuid, %s, %s, %s, %s, %s, %s, to_timestamp(%s))",
+                    page_size=1000,
+                    fetch=True  # rowcount solo cuenta la última página; RETURNING cuenta todas
                 )
-                SELECT
-                    id_lectura::uuid, -- Convertir de VARCHAR a UUID
-                    device_id,
-                    temperatura,
-                    humedad,
-                    distancia_cm,
-                    luz_porcentaje,
-                    estado_luz,
-                    to_timestamp(timestamp_lectura_unix) -- Convertir de UNIX int a Timestamp
-                FROM temp_lecturas
-                ON CONFLICT (id_lectura) DO NOTHING;
-            """
-            cursor.execute(insert_final_query)
-            registros_insertados = cursor.rowcount
+            registros_insertados = len(insertados)
+            
+            # Resumen para el ETag; también sirve para detectar filas escritas por otro proceso
+            stats = fetch_lecturas_stats(cursor)
             
             conn.commit()
+            
+            # Solo avanzamos el punto de sincronización cuando los datos ya están confirmados
+            _update_sync_state(items)
+            _refresh_lecturas_cache(cursor, stats, insertados)
             cursor.close()
             
             print(f"Sync: Sincronización automática completa. Registros nuevos: {registros_insertados}")
             return {"status": "success", "new_records": registros_insertados}
 
         except Exception as e:
-            if conn: conn.rollback()
+            # Solo una caída de la conexión puede haber perdido commits asíncronos ya confirmados;
+            # un error de datos o de SQL hace rollback sin tocar el estado incremental.
+            if isinstance(e, (OperationalError, InterfaceError)):
+                _reset_sync_state()
+            if conn: _safe_rollback(conn)
             print(f"Sync: Error en BD local durante sync: {e}")
             return {"status": "error_postgres", "error": str(e)}
         
         finally:
-            if conn: conn.close()
+            if conn: release_db_connection(conn)
 
 # ====================================================================
 # ENDPOINTS DE LA API (MODIFICADO)
@@ -159,31 +714,87 @@ def run_dynamo_sync():
 def get_lecturas():
     """
     Endpoint principal del Dashboard.
-    AHORA SOLO LEE de PostgreSQL. La sincronización corre en segundo plano.
+    AHORA SOLO LEE de PostgreSQL (o de la caché de lecturas recientes). La sincronización corre en segundo plano.
     """
     # --- PASO 1: Ya no se sincroniza aquí ---
     
-    # --- PASO 2: Leer y devolver los datos de PostgreSQL ---
-    print("Dashboard: Obteniendo datos de PostgreSQL...")
+    # --- PASO 2: Leer y devolver los datos de PostgreSQL (paginados) ---
+    # ?limit=N       -> cuántas lecturas devolver (las más recientes)
+    # ?before=<unix> -> solo lecturas anteriores a ese timestamp, para pedir la página anterior
+    # ?before_id=<id> -> desempate para lecturas del mismo segundo: con before=<unix> de la primera
+    #                    lectura de la página actual y before_id=<su id_lectura> no se pierde ninguna
+    limit = request.args.get('limit', default=LECTURAS_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, LECTURAS_MAX_LIMIT))
+    before = request.args.get('before', type=int)
+    before_id = request.args.get('before_id', type=uuid.UUID)
+    # before_id solo tiene sentido junto con before; se normaliza al texto canónico del UUID
+    before_id = str(before_id) if before is not None and before_id is not None else None
+    
     conn = None
     try:
-        conn = get_db_connection()
-        # Usamos RealDictCursor para que los resultados sean diccionarios (JSON)
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        # --- ETag: si el dashboard ya tiene esta versión de los datos, responder 304 sin consultar ---
+        stats = lecturas_stats if scheduler_running else None
+        if stats is None:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            stats = fetch_lecturas_stats(cursor)
+            cursor.close()
+        etag = hashlib.md5(f"{stats[0]}|{stats[1]}|{limit}|{before}|{before_id}".encode()).hexdigest()
+        if _etag_matches(etag):
+            not_modified = Response(status=304)
+            not_modified.set_etag(etag)
+            return not_modified
+        
+        # --- Caché en memoria: las páginas recientes se sirven sin tocar PostgreSQL ---
+        cache = lecturas_cache if scheduler_running else None
+        data = (lecturas_from_cache(cache, limit, before, before_id,
+                                    completa=len(cache['timestamp_lectura']) == stats[1])
+                if cache is not None else None)
+        if data is not None:
+            response = Response(data, mimetype='application/json')
+            response.set_etag(etag)
+            return response
+        
+        print("Dashboard: Obteniendo datos de PostgreSQL...")
+        if conn is None:
+            conn = get_db_connection()
+        cursor = conn.cursor()
         
-        # Ordenamos por timestamp para que los gráficos tengan sentido
-        cursor.execute("SELECT * FROM lecturas_sensores ORDER BY timestamp_lectura ASC")
-        data = cursor.fetchall()
+        filtro, params = "", (limit,)
+        if before_id is not None:
+            filtro, params = ("WHERE (timestamp_lectura, id_lectura) < (to_timestamp(%s), %s::uuid)",
+                              (before, before_id, limit))
+        elif before is not None:
+            filtro, params = "WHERE timestamp_lectura < to_timestamp(%s)", (before, limit)
+        
+        # PostgreSQL arma el JSON completo (LECTURAS_JSON_FILA + string_agg): Python solo recibe un texto,
+        # sin crear un dict por fila ni volver a serializar; la caché guarda exactamente las mismas filas.
+        # Se filtran en orden DESC para el LIMIT y se agregan en ASC para que los gráficos tengan sentido;
+        # id_lectura desempata las lecturas del mismo segundo para que la paginación sea estable.
+        # El índice de indexes.sql sobre (timestamp_lectura, id_lectura) evita el sort (index-only scan).
+        cursor.execute(f"""
+            SELECT COALESCE('[' || string_agg(l.fila, ',' ORDER BY l.timestamp_lectura ASC, l.id_lectura ASC) || ']', '[]')
+            FROM (
+                SELECT {LECTURAS_JSON_FILA} AS fila, timestamp_lectura, id_lectura
+                FROM lecturas_sensores
+                {filtro}
+                ORDER BY timestamp_lectura DESC, id_lectura DESC
+                LIMIT %s
+            ) l
+        """, params)
+        data = cursor.fetchone()[0]
         
         cursor.close()
-        return jsonify(data)
+        response = Response(data, mimetype='application/json')
+        response.set_etag(etag)
+        return response
 
     except Exception as e:
         print(f"Dashboard: Error al leer de PostgreSQL: {e}")
         return jsonify({"error": f"Error en la base de datos local: {str(e)}"}), 500
     finally:
         if conn:
-            conn.close()
+            release_db_connection(conn)
 
 
 @app.route('/sync-dynamo', methods=['GET'])
@@ -191,31 +802,53 @@ def manual_sync():
     """
     Endpoint para forzar una sincronización manual (el que ya tenías).
     Útil para probar.
+    Solo el proceso del scheduler sincroniza: _sync_lock es por proceso, y en otro worker de gunicorn
+    correría a la vez que el scheduler y dejaría su ETag y su caché desactualizados.
     """
+    if not scheduler_running:
+        return jsonify({"message": "Este proceso no ejecuta el scheduler; la sincronización corre en otro worker.",
+                        "result": {"status": "not_scheduler"}}), 409
     result = run_dynamo_sync()
+    if result.get("status") == "skipped":
+        return jsonify({"message": "Sincronización omitida: ya hay una en curso.", "result": result}), 409
     return jsonify({"message": "Sincronización manual completada.", "result": result})
 
 
-if __name__ == '__main__':
+# ====================================================================
+# TAREA PROGRAMADA (SCHEDULER)
+# ====================================================================
+def start_scheduler():
+    """
+    Arranca el scheduler de sincronización. Debe ejecutarse en UN solo proceso:
+    con `python app.py` se llama abajo; con gunicorn lo llama gunicorn.conf.py en un solo worker.
+    """
+    global scheduler_running
     # --- Configuración del Tarea Programada (Scheduler) ---
     scheduler = BackgroundScheduler()
     # Ejecuta run_dynamo_sync cada 60 segundos
-    scheduler.add_job(func=run_dynamo_sync, trigger="interval", seconds=60)
+    # max_instances=1 y coalesce=True: si una ejecución se atrasa, no se acumulan disparos pendientes
+    scheduler.add_job(func=run_dynamo_sync, trigger="interval", seconds=60,
+                      max_instances=1, coalesce=True)
     scheduler.start()
+    scheduler_running = True
     print("Sincronización automática iniciada. Se ejecutará cada minuto.")
     
     # Apagar el scheduler cuando la app se cierre
     atexit.register(lambda: scheduler.shutdown())
     
-    # --- Disparar la primera sincronización manualmente AHORA ---
-    # Esto nos da retroalimentación inmediata sin esperar 1 minuto.
-    print("--- Disparando primera sincronización AHORA... ---")
-    with app.app_context(): # Se necesita el contexto para esta llamada manual
-         run_dynamo_sync()
-    print("--- Primera sincronización completada. Iniciando servidor Flask. ---")
+    # --- Disparar la primera sincronización AHORA, en el pool del scheduler ---
+    # Esto nos da retroalimentación inmediata sin esperar 1 minuto y sin bloquear el arranque del servidor.
+    print("--- Disparando primera sincronización AHORA (en segundo plano)... ---")
+    scheduler.add_job(func=run_dynamo_sync, trigger="date", run_date=datetime.now())
+    return scheduler
+
+
+if __name__ == '__main__':
+    # Servidor de desarrollo. En producción usar gunicorn:
+    #   gunicorn -c gunicorn.conf.py app:app
+    start_scheduler()
+    print("--- Iniciando servidor Flask. ---")
 
     # Inicia la aplicación Flask
     # IMPORTANTE: use_reloader=False evita que el scheduler se inicie dos veces
     app.run(debug=True, port=5001, use_reloader=False)
-
-
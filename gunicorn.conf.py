@@ -0,0 +1,36 @@
+# Configuración de gunicorn para producción:
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# gthread: cada worker atiende varias peticiones a la vez con hilos.
+# Por defecto 1 worker para que el scheduler de sincronización exista una sola vez;
+# con más workers (GUNICORN_WORKERS) solo el que obtiene el candado de archivo arranca el scheduler.
+import os
+import fcntl
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+# Si threads (+1 del sync) supera DB_POOL_MAX, las peticiones de más esperan conexión (DB_POOL_TIMEOUT)
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+worker_class = "gthread"
+# Sin --reload: igual que use_reloader=False, evita scheduler duplicado
+
+SCHEDULER_LOCK_FILE = os.getenv("SCHEDULER_LOCK_FILE", "/tmp/aws_to_postgres_sync.scheduler.lock")
+
+# Descriptor abierto mientras viva el worker; el candado se libera al cerrarse el proceso
+_scheduler_lock = None
+
+def post_worker_init(worker):
+    """Arranca el scheduler solo en el worker que consigue el candado del archivo."""
+    global _scheduler_lock
+    # Sin truncar ni seguir symlinks: la ruta en /tmp es predecible
+    lock = os.open(SCHEDULER_LOCK_FILE, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(lock)
+        worker.log.info("Scheduler: otro worker ya ejecuta la sincronización.")
+        return
+    _scheduler_lock = lock
+
+    from app import start_scheduler
+    start_scheduler()
@@ -0,0 +1,14 @@
+-- Índices de soporte para lecturas_sensores.
+-- Ejecutar una vez por despliegue (CONCURRENTLY no bloquea las escrituras de la sincronización):
+--   psql -h $DB_HOST -U $DB_USER -d $DB_NAME -f indexes.sql
+--
+-- /api/lecturas ordena por (timestamp_lectura, id_lectura) con DESC + LIMIT (id_lectura desempata la
+-- paginación) y el ETag usa MAX(timestamp_lectura): con este índice no hace falta ordenar la tabla.
+-- El INCLUDE con el resto de columnas permite un index-only scan (PostgreSQL 11+).
+-- Un índice ASC se recorre igual de bien hacia atrás.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_lecturas_sensores_timestamp_id
+    ON lecturas_sensores (timestamp_lectura ASC, id_lectura ASC)
+    INCLUDE (device_id, temperatura, humedad, distancia_cm, luz_porcentaje, estado_luz);
+
+-- Mantener actualizado el visibility map para que el index-only scan no tenga que ir a la tabla
+VACUUM (ANALYZE) lecturas_sensores;
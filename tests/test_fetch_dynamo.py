@@ -0,0 +1,58 @@
+"""Elección entre Query incremental al GSI y Scan completo en fetch_dynamo_items, sin DynamoDB."""
+import pytest
+
+A = pytest.importorskip("app")
+
+SCAN = [{'id_lectura': 'scan'}]
+QUERY = [{'id_lectura': 'query'}]
+
+
+@pytest.fixture
+def dynamo(monkeypatch):
+    """Sustituye las llamadas a DynamoDB y registra con qué marcas se consultó el GSI."""
+    llamadas = []
+    monkeypatch.setattr(A, "scan_dynamo_parallel", lambda: SCAN)
+    monkeypatch.setattr(A, "query_dynamo_since", lambda marcas: llamadas.append(marcas) or QUERY)
+    monkeypatch.setattr(A, "DYNAMO_TS_INDEX", "device_id-timestamp-index")
+    monkeypatch.setattr(A, "DYNAMO_FULL_SCAN_EVERY", 60)
+    monkeypatch.setattr(A, "device_watermarks", {'d1': 100, 'd2': 50})
+    monkeypatch.setattr(A, "sync_runs", 1)
+    return llamadas
+
+
+def test_query_incremental_con_marcas_por_dispositivo(dynamo):
+    assert A.fetch_dynamo_items() is QUERY
+    assert dynamo == [{'d1': 100, 'd2': 50}]
+    # Se pasa una copia: la Query no ve cambios posteriores a las marcas
+    assert dynamo[0] is not A.device_watermarks
+
+
+def test_sin_gsi_siempre_scan(dynamo, monkeypatch):
+    monkeypatch.setattr(A, "DYNAMO_TS_INDEX", "")
+    assert A.fetch_dynamo_items() is SCAN
+    assert dynamo == []
+
+
+def test_sin_marcas_scan(dynamo, monkeypatch):
+    monkeypatch.setattr(A, "device_watermarks", {})
+    assert A.fetch_dynamo_items() is SCAN
+
+
+def test_scan_completo_periodico(dynamo, monkeypatch):
+    monkeypatch.setattr(A, "sync_runs", 120)
+    assert A.fetch_dynamo_items() is SCAN
+    assert dynamo == []
+
+
+def test_error_del_gsi_cae_al_scan(dynamo, monkeypatch):
+    def query_falla(marcas):
+        raise RuntimeError("ValidationException: index not found")
+    monkeypatch.setattr(A, "query_dynamo_since", query_falla)
+    assert A.fetch_dynamo_items() is SCAN
+
+
+def test_query_dynamo_since_consulta_cada_dispositivo_desde_su_marca(monkeypatch):
+    monkeypatch.setattr(A, "_query_device_since",
+                        lambda device_id, since_ts: [{'device_id': device_id, 'since': since_ts}])
+    items = A.query_dynamo_since({'d1': 100, 'd2': 50})
+    assert sorted((item['device_id'], item['since']) for item in items) == [('d1', 100), ('d2', 50)]
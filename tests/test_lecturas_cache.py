@@ -0,0 +1,128 @@
+"""
+/api/lecturas debe responder exactamente los mismos bytes desde la caché en memoria que desde PostgreSQL.
+
+Necesita un PostgreSQL accesible con las variables DB_* (las mismas de la app); si no hay, se omite.
+Cada prueba usa un esquema propio y una zona horaria distinta de UTC para el servidor.
+"""
+import time
+import uuid
+
+import pytest
+
+A = pytest.importorskip("app")
+psycopg2 = pytest.importorskip("psycopg2")
+from psycopg2.pool import ThreadedConnectionPool
+
+
+def _connect_kwargs(**extra):
+    return dict(dbname=A.DB_NAME, user=A.DB_USER, password=A.DB_PASS,
+                host=A.DB_HOST, port=A.DB_PORT, **extra)
+
+
+@pytest.fixture(params=["timestamptz", "timestamp"])
+def lecturas_db(request, monkeypatch):
+    """Esquema temporal con lecturas_sensores (columna de tiempo con y sin zona) y el pool de la app apuntándolo."""
+    try:
+        admin = psycopg2.connect(**_connect_kwargs(connect_timeout=3))
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL no disponible: {e}")
+    admin.autocommit = True
+    schema = f"test_lecturas_{uuid.uuid4().hex[:12]}"
+    with admin.cursor() as cursor:
+        cursor.execute(f"CREATE SCHEMA {schema}")
+        cursor.execute(f"""
+            CREATE TABLE {schema}.lecturas_sensores (
+                id_lectura UUID PRIMARY KEY,
+                device_id VARCHAR(50),
+                temperatura NUMERIC(5,2),
+                humedad NUMERIC(5,2),
+                distancia_cm NUMERIC(10,3),
+                luz_porcentaje INTEGER,
+                estado_luz VARCHAR(20),
+                timestamp_lectura {request.param}
+            )
+        """)
+
+    pool = ThreadedConnectionPool(
+        1, 4, **_connect_kwargs(options=f"-c search_path={schema} -c timezone=America/Mexico_City")
+    )
+    monkeypatch.setattr(A, "db_pool", pool)
+    monkeypatch.setattr(A, "lecturas_cache", None)
+    monkeypatch.setattr(A, "lecturas_stats", None)
+    monkeypatch.setattr(A, "scheduler_running", False)
+    try:
+        yield
+    finally:
+        pool.closeall()
+        with admin.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+        admin.close()
+
+
+def _lecturas(n, ahora):
+    """n lecturas de dos dispositivos, varias por segundo y con NULL, decimales y centésimas."""
+    return [
+        (str(uuid.uuid4()), f"esp32-{i % 2}", 20 + i * 0.25, 40.5 + i % 7, 12.345 + i,
+         None if i % 5 == 0 else i % 101, None if i % 3 == 0 else "ENCENDIDA", ahora - 3600 + i // 3)
+        for i in range(n)
+    ]
+
+
+def _sin_postgres():
+    raise AssertionError("la petición debía servirse desde la caché")
+
+
+def _respuestas(client, query):
+    """Cuerpo de /api/lecturas servido desde la caché (sin tocar PostgreSQL) y desde PostgreSQL."""
+    A.scheduler_running = True
+    get_db_connection, A.get_db_connection = A.get_db_connection, _sin_postgres
+    try:
+        cache = client.get(f"/api/lecturas{query}")
+    finally:
+        A.get_db_connection = get_db_connection
+    A.scheduler_running = False
+    db = client.get(f"/api/lecturas{query}")
+    assert cache.status_code == db.status_code == 200
+    return cache.get_data(), db.get_data()
+
+
+@pytest.mark.parametrize("insert", ["prepared", "load"])
+def test_cache_y_postgres_responden_los_mismos_bytes(lecturas_db, insert):
+    ahora = int(time.time())
+    filas = _lecturas(30, ahora)
+
+    conn = A.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        insertados = A.insert_lecturas_prepared(conn, cursor, filas)
+        A.lecturas_stats = A.fetch_lecturas_stats(cursor)
+        conn.commit()
+        # RETURNING (camino del sync) o SELECT (arranque en frío) deben llenar la caché igual
+        A.lecturas_cache = (A._cache_from_rows(sorted(insertados, key=lambda r: (r[0], r[1])))
+                            if insert == "prepared" else A.load_lecturas_cache(cursor))
+        cursor.close()
+    finally:
+        A.release_db_connection(conn)
+
+    assert A.lecturas_from_cache(A.lecturas_cache, 10, None) is not None
+    client = A.app.test_client()
+    cache, db = _respuestas(client, "?limit=10")
+    assert cache == db
+    assert cache.count(b'"id_lectura"') == 10
+
+    # Página anterior con desempate por id dentro del mismo segundo
+    primera = A.lecturas_cache['id_lectura'][-10]
+    before = int(A.lecturas_cache['timestamp_lectura'][-10])
+    cache, db = _respuestas(client, f"?limit=7&before={before}&before_id={primera}")
+    assert cache == db
+    assert cache.count(b'"id_lectura"') == 7
+
+    # La caché tiene toda la tabla: un limit mayor que las filas también sale de la caché
+    assert A.lecturas_from_cache(A.lecturas_cache, 100, None) is None
+    assert A.lecturas_from_cache(A.lecturas_cache, 100, None, completa=True) is not None
+    cache, db = _respuestas(client, "?limit=100")
+    assert cache == db
+    assert cache.count(b'"id_lectura"') == 30
+    cache, db = _respuestas(client, f"?limit=100&before={before}&before_id={primera}")
+    assert cache == db
+    assert cache.count(b'"id_lectura"') == 20
@@ -0,0 +1,68 @@
+"""Funciones puras de app.py: aplanado de items de DynamoDB, ETag y páginas desde la caché."""
+import pytest
+
+A = pytest.importorskip("app")
+
+
+def test_flatten_item_deja_texto_y_convierte_el_resto():
+    raw = {
+        'id_lectura': {'S': 'abc'}, 'temperatura': {'N': '23.4'},
+        'humedad': {'NULL': True}, 'activo': {'BOOL': False}, 'tags': {'L': [{'S': 'a'}]},
+    }
+    assert A._flatten_item(raw) == {
+        'id_lectura': 'abc', 'temperatura': '23.4', 'humedad': None, 'activo': False, 'tags': ['a'],
+    }
+
+
+@pytest.mark.parametrize("header, coincide", [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"abc:gzip"', True),     # Flask-Compress agrega el algoritmo al ETag
+    ('"otro", "abc:br"', True),
+    ('"abcd"', False),
+    ('"otro"', False),
+    (None, False),
+])
+def test_etag_matches(header, coincide):
+    headers = {'If-None-Match': header} if header else {}
+    with A.app.test_request_context(headers=headers):
+        assert A._etag_matches('abc') is coincide
+
+
+def _cache(filas):
+    """Caché a partir de (timestamp, id); el JSON de cada fila es solo su id para comparar fácil."""
+    return A._cache_from_rows([(ts, id_lectura, f'"{id_lectura}"') for ts, id_lectura in filas])
+
+
+CACHE = [(100, 'a'), (100, 'c'), (101, 'b'), (102, 'a'), (102, 'b'), (102, 'd'), (103, 'a')]
+
+
+def test_ultima_pagina():
+    assert A.lecturas_from_cache(_cache(CACHE), 3, None) == '["b","d","a"]'
+
+
+def test_before_sin_desempate():
+    assert A.lecturas_from_cache(_cache(CACHE), 2, 102) == '["c","b"]'
+
+
+def test_before_con_desempate_por_id():
+    # Del segundo 102 entran solo las lecturas con id menor que 'b'
+    assert A.lecturas_from_cache(_cache(CACHE), 3, 102, 'b') == '["c","b","a"]'
+    assert A.lecturas_from_cache(_cache(CACHE), 2, 102, 'c') == '["a","b"]'
+
+
+def test_faltan_filas():
+    assert A.lecturas_from_cache(_cache(CACHE), 10, None) is None
+    assert A.lecturas_from_cache(_cache(CACHE), 3, 101) is None
+
+
+def test_cache_completa_devuelve_lo_que_hay():
+    assert A.lecturas_from_cache(_cache(CACHE), 10, 101, completa=True) == '["a","c"]'
+    assert A.lecturas_from_cache(_cache(CACHE), 10, 100, completa=True) == '[]'
+
+
+def test_append_ordena_y_descarta_viejas(monkeypatch):
+    monkeypatch.setattr(A, "_cache_cutoff_ts", lambda: 101)
+    cache = A.append_lecturas_cache(_cache(CACHE), [(101, 'a', '"nueva"'), (99, 'z', '"vieja"')])
+    assert list(cache['id_lectura']) == ['a', 'b', 'a', 'b', 'd', 'a']
+    assert list(cache['fila'][:2]) == ['"nueva"', '"b"']
@@ -0,0 +1,75 @@
+"""Estado incremental de la sincronización (marcas por dispositivo y seen_ids), sin PostgreSQL."""
+import pytest
+
+A = pytest.importorskip("app")
+
+AHORA = 1_700_000_000
+
+
+@pytest.fixture(autouse=True)
+def estado_limpio(monkeypatch):
+    monkeypatch.setattr(A, "device_watermarks", {})
+    monkeypatch.setattr(A, "seen_ids", {})
+    monkeypatch.setattr(A, "SEEN_IDS_MARGIN_SECONDS", 3600)
+
+
+def _items(device_id, n, paso=60, inicio=AHORA):
+    return [{'id_lectura': f"{device_id}-{i}", 'device_id': device_id, 'timestamp': str(inicio + i * paso)}
+            for i in range(n)]
+
+
+def test_marca_por_dispositivo():
+    A._update_sync_state(_items('d1', 3) + _items('d2', 2, inicio=AHORA - 500)
+                         + [{'id_lectura': 'sin-device', 'timestamp': str(AHORA)}])
+    assert A.device_watermarks == {'d1': AHORA + 120, 'd2': AHORA - 440}
+    # Un dispositivo atrasado no hace retroceder la marca
+    A._update_sync_state([{'id_lectura': 'viejo', 'device_id': 'd1', 'timestamp': str(AHORA)}])
+    assert A.device_watermarks['d1'] == AHORA + 120
+
+
+def test_timestamp_decimal():
+    A._update_sync_state([{'id_lectura': 'x', 'device_id': 'd1', 'timestamp': '1700000000.0'}])
+    assert A.device_watermarks == {'d1': AHORA}
+    assert A.seen_ids == {'x': ('d1', AHORA)}
+
+
+def test_solo_scan_guarda_todos_los_ids(monkeypatch):
+    # 4 h de un dispositivo: sin GSI cada sincronización vuelve a traerlas todas
+    monkeypatch.setattr(A, "SEEN_IDS_BOUNDED", False)
+    items = _items('d1', 240)
+    A._update_sync_state(items)
+    assert len(A.seen_ids) == 240
+    assert [item for item in items if item['id_lectura'] not in A.seen_ids] == []
+
+
+def test_con_gsi_se_poda_a_la_ventana(monkeypatch):
+    monkeypatch.setattr(A, "SEEN_IDS_BOUNDED", True)
+    A._update_sync_state(_items('d1', 240) + _items('d2', 3, inicio=AHORA - 86400))
+    marca = A.device_watermarks['d1']
+    assert all(ts >= marca - 3600 for device_id, ts in A.seen_ids.values() if device_id == 'd1')
+    assert sum(1 for device_id, _ in A.seen_ids.values() if device_id == 'd1') == 61
+    # Cada dispositivo se poda contra su propia marca
+    assert sum(1 for device_id, _ in A.seen_ids.values() if device_id == 'd2') == 3
+
+
+def test_sin_seen_ids_cargados_solo_avanza_la_marca(monkeypatch):
+    monkeypatch.setattr(A, "seen_ids", None)
+    A._update_sync_state(_items('d1', 2))
+    assert A.seen_ids is None
+    assert A.device_watermarks == {'d1': AHORA + 60}
+
+
+def test_reset_sync_state(monkeypatch):
+    monkeypatch.setattr(A, "lecturas_stats", ('x', 1))
+    monkeypatch.setattr(A, "lecturas_cache", {})
+    A._update_sync_state(_items('d1', 2))
+    A._reset_sync_state()
+    assert A.device_watermarks == {}
+    assert A.seen_ids is None and A.lecturas_stats is None and A.lecturas_cache is None
+
+
+def test_solo_scan_no_consulta_postgres(monkeypatch):
+    monkeypatch.setattr(A, "SEEN_IDS_BOUNDED", False)
+    monkeypatch.setattr(A, "get_db_connection", lambda: pytest.fail("no debía consultar PostgreSQL"))
+    items = _items('d1', 3)
+    assert A.drop_synced_in_db(items) is items